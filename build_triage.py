@@ -1,7 +1,6 @@
-"""Build triage.duckdb with Economic Agency Index data from BEA CAINC4"""
+"""Build triage.parquet and triage.duckdb with Economic Agency Index data from BEA CAINC4"""
 import duckdb
-import pandas as pd
-import yaml
+import numpy as np
 from pathlib import Path
 import logging
 
@@ -9,8 +8,82 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def load_and_process_cainc4():
-    """Load CAINC4 data and calculate Economic Agency Index"""
+# Approximate state center coordinates
+STATE_COORDS = {
+    1: (32.7, -86.8),  # Alabama
+    2: (64.0, -153.0),  # Alaska
+    4: (34.2, -111.5),  # Arizona
+    5: (35.2, -92.4),  # Arkansas
+    6: (36.7, -119.7),  # California
+    8: (39.0, -105.5),  # Colorado
+    9: (41.6, -72.7),  # Connecticut
+    10: (39.0, -75.5),  # Delaware
+    11: (38.9, -77.0),  # DC
+    12: (27.8, -81.7),  # Florida
+    13: (32.9, -83.2),  # Georgia
+    15: (21.1, -157.8),  # Hawaii
+    16: (44.2, -114.5),  # Idaho
+    17: (40.3, -89.0),  # Illinois
+    18: (39.8, -86.1),  # Indiana
+    19: (42.0, -93.2),  # Iowa
+    20: (38.5, -96.7),  # Kansas
+    21: (37.7, -84.9),  # Kentucky
+    22: (31.1, -91.8),  # Louisiana
+    23: (44.6, -69.8),  # Maine
+    24: (39.0, -76.8),  # Maryland
+    25: (42.2, -71.5),  # Massachusetts
+    26: (43.3, -84.5),  # Michigan
+    27: (45.7, -93.9),  # Minnesota
+    28: (32.7, -89.7),  # Mississippi
+    29: (38.4, -92.2),  # Missouri
+    30: (47.0, -110.0),  # Montana
+    31: (41.1, -98.0),  # Nebraska
+    32: (38.4, -117.0),  # Nevada
+    33: (43.4, -71.5),  # New Hampshire
+    34: (40.3, -74.5),  # New Jersey
+    35: (34.8, -106.2),  # New Mexico
+    36: (42.1, -74.9),  # New York
+    37: (35.6, -79.0),  # North Carolina
+    38: (47.5, -99.8),  # North Dakota
+    39: (40.3, -82.8),  # Ohio
+    40: (35.6, -96.9),  # Oklahoma
+    41: (44.5, -122.0),  # Oregon
+    42: (40.5, -77.5),  # Pennsylvania
+    44: (41.7, -71.5),  # Rhode Island
+    45: (33.8, -80.9),  # South Carolina
+    46: (44.2, -99.8),  # South Dakota
+    47: (35.7, -86.0),  # Tennessee
+    48: (31.0, -97.5),  # Texas
+    49: (40.1, -111.9),  # Utah
+    50: (44.0, -72.7),  # Vermont
+    51: (37.7, -78.2),  # Virginia
+    53: (47.3, -121.0),  # Washington
+    54: (38.4, -80.9),  # West Virginia
+    55: (44.3, -89.6),  # Wisconsin
+    56: (42.7, -107.3),  # Wyoming
+}
+
+# Lookup arrays indexed by 2-digit state code; unknown states map to the center of the US
+STATE_LAT = np.full(100, 39.0)
+STATE_LNG = np.full(100, -98.0)
+for _code, (_lat, _lng) in STATE_COORDS.items():
+    STATE_LAT[_code] = _lat
+    STATE_LNG[_code] = _lng
+
+def get_county_coordinates(fips_int):
+    """Generate approximate coordinates for an array of integer county FIPS codes"""
+    fips_int = np.asarray(fips_int)
+    state_code = fips_int // 1000
+    county_code = fips_int % 1000
+
+    # Add variation based on county code to spread counties within state
+    lat_offset = (county_code % 20 - 10) * 0.15
+    lng_offset = ((county_code // 20) % 20 - 10) * 0.2
+
+    return STATE_LAT[state_code] + lat_offset, STATE_LNG[state_code] + lng_offset
+
+def load_and_process_cainc4(con):
+    """Load CAINC4 data into DuckDB and calculate Economic Agency Index"""
 
     # Path to the all areas CSV file
     csv_path = Path('data/CAINC4__ALL_AREAS_1969_2023.csv')
@@ -22,85 +95,109 @@ def load_and_process_cainc4():
 
     logger.info("Loading CAINC4 data...")
 
-    # Read the CSV file
-    df = pd.read_csv(csv_path, encoding='latin-1', low_memory=False)
-    logger.info(f"Loaded {len(df)} rows")
-
-    # Clean up GeoFIPS - remove quotes and spaces
-    df['GeoFIPS_clean'] = df['GeoFIPS'].str.strip().str.strip('"')
-
-    # Filter for county data only (5-digit FIPS codes that don't end in 000)
-    df['is_county'] = (df['GeoFIPS_clean'].str.match(r'^\d{5}$') &
-                       ~df['GeoFIPS_clean'].str.endswith('000'))
-    county_data = df[df['is_county']].copy()
-
-    logger.info(f"Found {len(county_data['GeoFIPS_clean'].unique())} counties")
-
-    # Get the three components we need
-    wages = county_data[county_data['LineCode'] == 50].copy()
-    property_income = county_data[county_data['LineCode'] == 46].copy()
-    transfers = county_data[county_data['LineCode'] == 47].copy()
-
-    logger.info(f"Wages data: {len(wages)} rows")
-    logger.info(f"Property income data: {len(property_income)} rows")
-    logger.info(f"Transfers data: {len(transfers)} rows")
-
     # Get the most recent year data (2023)
     year_col = '2023'
 
-    # Reshape data for easier processing
-    def get_component_data(df, component_name):
-        result = df[['GeoFIPS_clean', 'GeoName', year_col]].copy()
-        result.columns = ['fips', 'county_name', component_name]
-        # Convert to numeric, handling (NA) and other text values
-        result[component_name] = pd.to_numeric(
-            result[component_name].astype(str).str.replace('(NA)', '0').str.replace('(D)', '0'),
-            errors='coerce'
+    # Let DuckDB parse the CSV so only the columns and rows we need are
+    # materialized. The dialect is fixed up front rather than sniffed, and
+    # null_padding lets the short footnote lines at the end of the file
+    # through. GeoFIPS is quoted with a leading space in the BEA file, and
+    # county rows are 5-digit FIPS codes that don't end in 000; the filter
+    # reuses the cleaned select-list aliases so each value is trimmed and
+    # cast only once.
+    # CREATE TABLE AS reports the number of rows inserted, so no separate count is needed
+    raw_rows = con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE raw AS
+        SELECT
+            trim(GeoFIPS, '" ') AS fips,
+            GeoName AS county_name,
+            TRY_CAST(LineCode AS INTEGER) AS line_code,
+            -- (NA) and (D) suppression markers count as 0
+            coalesce(TRY_CAST("{year_col}" AS BIGINT), 0) AS value
+        FROM read_csv(
+            '{csv_path.as_posix()}',
+            encoding='latin-1',
+            header=true,
+            delim=',',
+            quote='"',
+            all_varchar=true,
+            null_padding=true
         )
-        result[component_name] = result[component_name].fillna(0)
-        return result.set_index('fips')
-
-    wages_2023 = get_component_data(wages, 'wages')
-    property_2023 = get_component_data(property_income, 'property')
-    transfers_2023 = get_component_data(transfers, 'transfers')
-
-    logger.info(f"Sample wages data: {wages_2023.head()}")
-
-    # Combine all components
-    eai_data = wages_2023.join(property_2023[['property']], how='outer').join(transfers_2023[['transfers']], how='outer')
-
-    # Fill any remaining NaN values with 0
-    eai_data = eai_data.fillna(0)
-
-    # Calculate Economic Agency Index components
-    eai_data['total_income'] = eai_data['wages'] + eai_data['property'] + eai_data['transfers']
-
-    # Calculate wage ratio (simplified EAI for MVP)
-    # This represents economic agency - higher wage ratio = more agency
-    eai_data['wage_ratio'] = eai_data['wages'] / eai_data['total_income']
-    eai_data['wage_ratio'] = eai_data['wage_ratio'].fillna(0)
-
-    # Also calculate property ratio for future use
-    eai_data['property_ratio'] = eai_data['property'] / eai_data['total_income']
-    eai_data['property_ratio'] = eai_data['property_ratio'].fillna(0)
-
-    # Reset index to have fips as a column
-    eai_data = eai_data.reset_index()
-
-    # Add year column
-    eai_data['year'] = 2023
-
-    # Use wage_ratio as our primary metric (compatible with existing dashboard)
-    eai_data['prime_epop'] = eai_data['wage_ratio']
-
-    # Select final columns and remove invalid/missing data
-    final_data = eai_data[['fips', 'year', 'prime_epop', 'county_name', 'wages', 'property', 'transfers']].copy()
-
-    # Remove rows where total income is 0 or very small
-    final_data = final_data[final_data['wages'] + final_data['property'] + final_data['transfers'] > 1000]
-
-    # Remove any remaining NaN values
-    final_data = final_data.dropna()
+        WHERE line_code IN (46, 47, 50)
+          AND regexp_matches(fips, '^[0-9]{{5}}$')
+          AND NOT ends_with(fips, '000')
+    """).fetchone()[0]
+
+    logger.info(f"Loaded {raw_rows} county rows")
+
+    # Census county centroids (from download_county_coordinates.py) form a
+    # small dimension table joined on fips. Older downloads saved a CSV
+    # rather than Parquet. Without either file the table is empty and every
+    # county falls back to its approximate position below.
+    parquet_coords = Path('data/county_coordinates.parquet')
+    csv_coords = Path('data/county_coordinates.csv')
+    if parquet_coords.exists():
+        coords_source = f"read_parquet('{parquet_coords.as_posix()}')"
+    elif csv_coords.exists():
+        coords_source = f"read_csv('{csv_coords.as_posix()}', types={{'fips': 'VARCHAR'}})"
+    else:
+        coords_source = None
+
+    if coords_source:
+        con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE fips_coords AS
+            SELECT fips, latitude, longitude FROM {coords_source}
+        """)
+    else:
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE fips_coords (fips VARCHAR, latitude DOUBLE, longitude DOUBLE)
+        """)
+
+    # Pivot the three components into columns in a single pass and
+    # calculate the wage ratio (simplified EAI for MVP) in the same query.
+    # Higher wage ratio = more economic agency.
+    final_data = con.execute("""
+        WITH components AS (
+            PIVOT raw ON line_code IN (50 AS wages, 46 AS property, 47 AS transfers)
+            USING first(value)
+            GROUP BY fips, county_name
+        ),
+        eai_data AS (
+            SELECT
+                fips,
+                county_name,
+                coalesce(wages, 0) AS wages,
+                coalesce(property, 0) AS property,
+                coalesce(transfers, 0) AS transfers,
+                coalesce(wages, 0) + coalesce(property, 0) + coalesce(transfers, 0) AS total_income
+            FROM components
+        )
+        SELECT
+            fips,
+            CAST(fips AS INTEGER) AS fips_int,
+            2023 AS year,
+            CASE WHEN total_income > 0 THEN wages / total_income ELSE 0 END AS prime_epop,
+            county_name,
+            wages,
+            property,
+            transfers,
+            latitude,
+            longitude
+        FROM eai_data
+        LEFT JOIN fips_coords USING (fips)
+        -- Remove rows where total income is 0 or very small
+        WHERE total_income > 1000
+        ORDER BY fips
+    """).df()
+
+    # Coordinates are a pure function of FIPS, so store them with the data;
+    # counties without a Census centroid get the approximate position
+    missing = final_data['latitude'].isna().to_numpy()
+    logger.info(f"Matched {len(final_data) - missing.sum()} counties to Census coordinates")
+    if missing.any():
+        lat, lng = get_county_coordinates(final_data.loc[missing, 'fips_int'])
+        final_data.loc[missing, 'latitude'] = lat
+        final_data.loc[missing, 'longitude'] = lng
 
     logger.info(f"Processed {len(final_data)} counties with complete data")
     logger.info(f"Sample data:\n{final_data.head()}")
@@ -111,34 +208,57 @@ def main():
     """Main ETL process"""
     logger.info("Starting Economic Agency Index ETL process...")
 
+    # Run the ETL in memory; triage.duckdb is only attached to publish the view
+    con = duckdb.connect(':memory:')
+    con.execute('PRAGMA memory_limit="1GB"')
+
     # Load and process data
-    data = load_and_process_cainc4()
+    data = load_and_process_cainc4(con)
 
     if data is None or len(data) == 0:
         logger.error("Failed to load data or no valid counties found")
+        con.close()
         return
 
-    # Create DuckDB database
-    con = duckdb.connect('triage.duckdb')
-    con.execute('PRAGMA memory_limit="1GB"')
-
-    # Create table with the data
+    # Write the parquet file straight from the processed data, clustered by
+    # year so each year's ~3,100 counties are a contiguous run of rows. A
+    # 4096-row ZSTD row group then only spans neighbouring years (up to
+    # three), and year filters skip the groups whose min/max stats exclude
+    # that year.
+    # Within a year rows are sorted by wage ratio so readers get the most
+    # stressed counties first.
     con.register('eai_data', data)
     con.execute('''
-        CREATE OR REPLACE TABLE triage AS 
-        SELECT 
-            fips,
-            year,
-            prime_epop,
-            county_name,
-            wages,
-            property,
-            transfers
-        FROM eai_data
+        COPY (
+            SELECT 
+                fips,
+                fips_int,
+                year,
+                prime_epop,
+                county_name,
+                wages,
+                property,
+                transfers,
+                latitude,
+                longitude
+            FROM eai_data
+            ORDER BY year, prime_epop, fips
+        ) TO 'triage.parquet'
+        (FORMAT 'parquet', COMPRESSION 'zstd', COMPRESSION_LEVEL 3, ROW_GROUP_SIZE 4096)
     ''')
 
-    # Also save as parquet
-    con.execute("COPY (SELECT * FROM triage) TO 'triage.parquet' (FORMAT 'parquet')")
+    # Load triage.duckdb from the parquet file just written, so the data is
+    # only computed once. It stores a real table rather than a view over
+    # read_parquet, because a view would keep a path to triage.parquet that
+    # breaks when the database is opened from another directory or machine.
+    # Builds in between stored triage as a view, which has to be dropped first.
+    con.execute("ATTACH 'triage.duckdb' AS out")
+    if con.execute("""
+        SELECT COUNT(*) FROM duckdb_views()
+        WHERE database_name = 'out' AND view_name = 'triage'
+    """).fetchone()[0]:
+        con.execute('DROP VIEW out.triage')
+    con.execute("CREATE OR REPLACE TABLE out.triage AS SELECT * FROM read_parquet('triage.parquet')")
 
     # Show summary statistics
     stats = con.execute('''
@@ -147,7 +267,7 @@ def main():
             AVG(prime_epop) as avg_wage_ratio,
             MIN(prime_epop) as min_wage_ratio,
             MAX(prime_epop) as max_wage_ratio
-        FROM triage
+        FROM out.triage
     ''').fetchone()
 
     logger.info(f"Database created successfully!")
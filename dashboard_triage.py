@@ -1,10 +1,21 @@
 import streamlit as st
-import duckdb
 import pandas as pd
-import pydeck as pdk
 import numpy as np
+import pyarrow as pa
+import os
 import pathlib
 from datetime import datetime
+from functools import partial
+
+# Map colors (RGBA) indexed by stress code: High, Medium, Low
+STRESS_COLORS = np.array([
+    [220, 38, 38, 160],  # Red
+    [245, 158, 11, 160],  # Orange
+    [16, 185, 129, 160]  # Green
+], dtype=np.uint8)
+
+# Sidebar stress filter labels and the stress_level values they select
+STRESS_MAP = {'High Stress': 'High', 'Medium Stress': 'Medium', 'Low Stress': 'Low'}
 
 # Page configuration
 st.set_page_config(
@@ -15,368 +26,302 @@ st.set_page_config(
 )
 
 # Custom CSS for styling
-st.markdown("""
-<style>
-    .title-container {
-        background-color: #1E3A8A;
-        padding: 1.5rem;
-        border-radius: 5px;
-        margin-bottom: 1.5rem;
-        color: white;
-    }
-    .title-text {
-        font-size: 2.2rem;
-        font-weight: bold;
-        margin: 0;
-    }
-    .subtitle-text {
-        font-size: 1rem;
-        opacity: 0.9;
-        margin: 0.5rem 0 0 0;
-    }
-    .metric-card {
-        background-color: white;
-        border-radius: 5px;
-        padding: 1rem;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.12);
-        text-align: center;
-    }
-    .metric-value {
-        font-size: 2rem;
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-    }
-    .metric-label {
-        font-size: 0.9rem;
-        color: #666;
-    }
-    .high-stress {
-        color: #DC2626;
-    }
-    .medium-stress {
-        color: #F59E0B;
-    }
-    .low-stress {
-        color: #10B981;
-    }
-    .footer {
-        text-align: center;
-        margin-top: 2rem;
-        font-size: 0.8rem;
-        color: #6B7280;
-    }
-    .section-header {
-        font-size: 1.5rem;
-        font-weight: bold;
-        margin: 1.5rem 0 1rem 0;
-        padding-bottom: 0.5rem;
-        border-bottom: 1px solid #E5E7EB;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css(path):
+    """Read the dashboard stylesheet once and share the wrapped string across sessions"""
+    return f"<style>\n{pathlib.Path(path).read_text()}</style>"
 
 
-def get_county_coordinates(fips):
-    """Generate approximate coordinates for US counties based on FIPS codes"""
-    if not fips or len(str(fips)) != 5:
-        return 39.0, -98.0  # Center of US
-
-    # Convert to string and get state/county codes
-    fips_str = str(fips).zfill(5)
-    state_code = int(fips_str[:2])
-    county_code = int(fips_str[2:])
-
-    # Approximate state center coordinates
-    state_coords = {
-        1: (32.7, -86.8),  # Alabama
-        2: (64.0, -153.0),  # Alaska
-        4: (34.2, -111.5),  # Arizona
-        5: (35.2, -92.4),  # Arkansas
-        6: (36.7, -119.7),  # California
-        8: (39.0, -105.5),  # Colorado
-        9: (41.6, -72.7),  # Connecticut
-        10: (39.0, -75.5),  # Delaware
-        11: (38.9, -77.0),  # DC
-        12: (27.8, -81.7),  # Florida
-        13: (32.9, -83.2),  # Georgia
-        15: (21.1, -157.8),  # Hawaii
-        16: (44.2, -114.5),  # Idaho
-        17: (40.3, -89.0),  # Illinois
-        18: (39.8, -86.1),  # Indiana
-        19: (42.0, -93.2),  # Iowa
-        20: (38.5, -96.7),  # Kansas
-        21: (37.7, -84.9),  # Kentucky
-        22: (31.1, -91.8),  # Louisiana
-        23: (44.6, -69.8),  # Maine
-        24: (39.0, -76.8),  # Maryland
-        25: (42.2, -71.5),  # Massachusetts
-        26: (43.3, -84.5),  # Michigan
-        27: (45.7, -93.9),  # Minnesota
-        28: (32.7, -89.7),  # Mississippi
-        29: (38.4, -92.2),  # Missouri
-        30: (47.0, -110.0),  # Montana
-        31: (41.1, -98.0),  # Nebraska
-        32: (38.4, -117.0),  # Nevada
-        33: (43.4, -71.5),  # New Hampshire
-        34: (40.3, -74.5),  # New Jersey
-        35: (34.8, -106.2),  # New Mexico
-        36: (42.1, -74.9),  # New York
-        37: (35.6, -79.0),  # North Carolina
-        38: (47.5, -99.8),  # North Dakota
-        39: (40.3, -82.8),  # Ohio
-        40: (35.6, -96.9),  # Oklahoma
-        41: (44.5, -122.0),  # Oregon
-        42: (40.5, -77.5),  # Pennsylvania
-        44: (41.7, -71.5),  # Rhode Island
-        45: (33.8, -80.9),  # South Carolina
-        46: (44.2, -99.8),  # South Dakota
-        47: (35.7, -86.0),  # Tennessee
-        48: (31.0, -97.5),  # Texas
-        49: (40.1, -111.9),  # Utah
-        50: (44.0, -72.7),  # Vermont
-        51: (37.7, -78.2),  # Virginia
-        53: (47.3, -121.0),  # Washington
-        54: (38.4, -80.9),  # West Virginia
-        55: (44.3, -89.6),  # Wisconsin
-        56: (42.7, -107.3),  # Wyoming
-    }
-
-    # Get base coordinates for the state
-    base_lat, base_lng = state_coords.get(state_code, (39.0, -98.0))
-
-    # Add variation based on county code to spread counties within state
-    lat_offset = (county_code % 20 - 10) * 0.15
-    lng_offset = ((county_code // 20) % 20 - 10) * 0.2
-
-    return base_lat + lat_offset, base_lng + lng_offset
+st.markdown(load_css(pathlib.Path(__file__).parent / 'static' / 'style.css'), unsafe_allow_html=True)
 
 
 # Database connection
-DB = pathlib.Path(__file__).parent / 'triage.duckdb'
+DB = pathlib.Path(__file__).parent / 'triage.parquet'
 if not DB.exists():
     st.error('Database not found. Please run build_triage.py first.')
     st.stop()
 
+
+@st.cache_resource
+def get_conn(path):
+    """Open an in-memory DuckDB connection with a triage view over the parquet file
+
+    The connection is shared by every session, and a DuckDB connection is not
+    thread-safe, so queries must run on their own get_conn(path).cursor().
+    """
+    import duckdb
+
+    con = duckdb.connect()
+    # Use every core the host offers for scans, but cap memory per process.
+    # Set globally on the parent so every per-query cursor inherits them.
+    con.execute(f"SET GLOBAL threads = {os.cpu_count() or 4}")
+    con.execute("SET GLOBAL memory_limit = '1GB'")
+    con.execute(f"CREATE VIEW triage AS SELECT * FROM read_parquet('{path}')")
+    return con
+
+
+@st.cache_data
+def load_summary(path: str):
+    """Count the rows and list the available years without loading the table"""
+    with get_conn(path).cursor() as cur:
+        return cur.execute(
+            "SELECT COUNT(*), list(DISTINCT year ORDER BY year) FROM triage"
+        ).fetchone()
+
+
+# Select the year and add stress classification in SQL
+def arrow_dtype(arrow_type):
+    """Keep Arrow-backed columns, but let dictionary columns convert to pandas categoricals"""
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+@st.cache_data
+def query_year(year, high_thresh, medium_thresh):
+    """Fetch the columns the page uses for one year, with stress levels classified by DuckDB"""
+    # Wage ratios only need float32 precision for display, but classification
+    # and ordering use the full-precision triage.prime_epop so they always agree.
+    # stress_level is returned as an ENUM, which arrives as an Arrow dictionary column
+    with get_conn(DB.as_posix()).cursor() as cur:
+        tbl = cur.execute("""
+            SELECT
+                fips,
+                county_name,
+                CAST(prime_epop AS FLOAT) AS prime_epop,
+                latitude,
+                longitude,
+                CAST(
+                    CASE
+                        WHEN triage.prime_epop < ? THEN 'High'
+                        WHEN triage.prime_epop < ? THEN 'Medium'
+                        ELSE 'Low'
+                    END AS ENUM('High', 'Medium', 'Low')
+                ) AS stress_level
+            FROM triage
+            WHERE year = ?
+            ORDER BY triage.prime_epop, fips
+        """, [high_thresh, medium_thresh, year]).to_arrow_table()
+    for col in ['fips', 'county_name']:
+        tbl = tbl.set_column(tbl.schema.get_field_index(col), col, tbl[col].dictionary_encode())
+    return tbl.to_pandas(types_mapper=arrow_dtype)
+
+
+@st.cache_data
+def query_metrics(year, high_thresh):
+    """Average the wage ratios overall and for high-stress counties for one year in a single scan"""
+    with get_conn(DB.as_posix()).cursor() as cur:
+        return cur.execute("""
+            SELECT
+                AVG(prime_epop) AS overall_avg,
+                AVG(prime_epop) FILTER (WHERE prime_epop < $high) AS high_stress_avg
+            FROM triage
+            WHERE year = $year
+        """, {'high': high_thresh, 'year': year}).fetchone()
+
+
+@st.cache_data
+def to_csv_bytes(_df, columns, *filter_key):
+    """Serialize a filtered frame to CSV bytes, cached on filter_key instead of hashing the frame"""
+    # The float32 wage ratios are written at their own precision (7 significant
+    # digits) rather than as widened doubles like 0.3499999940395355
+    return _df[list(columns)].to_csv(index=False, float_format='%.7g').encode()
+
+
 try:
-    con = duckdb.connect(DB.as_posix(), read_only=True)
-    df = con.table('triage').to_df()
-    con.close()
+    county_count, available_years = load_summary(DB.as_posix())
 except Exception as e:
     st.error(f"Error connecting to database: {str(e)}")
     st.stop()
 
-# Add coordinates to all counties
-df['latitude'] = df['fips'].apply(lambda x: get_county_coordinates(x)[0])
-df['longitude'] = df['fips'].apply(lambda x: get_county_coordinates(x)[1])
-
 # Create header
 st.markdown(f"""
 <div class="title-container">
     <h1 class="title-text">Post-Labor Economics: Economic Agency Dashboard</h1>
-    <p class="subtitle-text">Wage dependency analysis across {len(df):,} US Counties</p>
+    <p class="subtitle-text">Wage dependency analysis across {county_count:,} US Counties</p>
 </div>
 """, unsafe_allow_html=True)
 
 # Check if we have data
-if len(df) < 10:
+if county_count < 10:
     st.error("Insufficient data. Please run build_triage.py to generate complete data.")
     st.stop()
 
-# Sidebar controls
+# Sidebar controls are drawn by the fragment below; the sidebar needs a write
+# from the full run first so the fragment can add to it on its own reruns
 with st.sidebar:
     st.header("Controls")
 
-    # Year selection
-    available_years = sorted(df['year'].unique())
-    selected_year = st.selectbox("Year", options=available_years, index=len(available_years) - 1)
 
-    # Thresholds
-    st.markdown("### Economic Agency Thresholds")
-    st.caption("Wage ratio = wages / (wages + property + transfers)")
+# Widgets and everything they drive live in one fragment, so changing a
+# control reruns only this part of the page, not the header, CSS and footer
+@st.fragment
+def render_dashboard():
+    with st.sidebar:
+        # Year selection
+        selected_year = st.selectbox("Year", options=available_years, index=len(available_years) - 1)
 
-    high_threshold = st.slider("High Stress (wage ratio below)", 0.20, 0.50, 0.35, 0.01)
-    medium_threshold = st.slider("Medium Stress (wage ratio below)", high_threshold, 0.70, 0.50, 0.01)
+        # Thresholds
+        st.markdown("### Economic Agency Thresholds")
+        st.caption("Wage ratio = wages / (wages + property + transfers)")
 
-    # Filters
-    stress_options = ["High Stress", "Medium Stress", "Low Stress"]
-    selected_stress = st.multiselect("Show Stress Levels", stress_options, default=stress_options)
+        high_threshold = st.slider("High Stress (wage ratio below)", 0.20, 0.50, 0.35, 0.01)
+        medium_threshold = st.slider("Medium Stress (wage ratio below)", high_threshold, 0.70, 0.50, 0.01)
 
-    st.markdown("---")
-    st.markdown(f"""
-    **Economic Agency Index**
+        # Filters
+        stress_options = list(STRESS_MAP)
+        selected_stress = st.multiselect("Show Stress Levels", stress_options, default=stress_options)
 
-    Higher wage ratios indicate more economic agency and self-sufficiency.
+    year_data = query_year(selected_year, high_threshold, medium_threshold)
 
-    **{len(df):,} counties** analyzed using BEA personal income data.
-    """)
+    # Apply filters
+    stress_filter = frozenset(STRESS_MAP[s] for s in selected_stress)
 
-# Filter data
-year_data = df[df['year'] == selected_year].copy()
+    # Every level selected (the default) needs no filtering at all
+    if len(stress_filter) == len(STRESS_MAP):
+        filtered_data = year_data
+    else:
+        filtered_data = year_data[year_data['stress_level'].isin(stress_filter)]
 
+    # Key metrics
+    col1, col2, col3 = st.columns(3)
 
-# Add stress classification
-def classify_stress(wage_ratio, high_thresh, medium_thresh):
-    if wage_ratio < high_thresh:
-        return 'High'
-    elif wage_ratio < medium_thresh:
-        return 'Medium'
-    else:
-        return 'Low'
+    overall_avg, high_stress_avg = query_metrics(selected_year, high_threshold)
+    # Taken from the classification itself, so it always agrees with the map;
+    # year_data is ordered by wage ratio, so this slice is too
+    high_stress_counties = year_data[year_data['stress_level'] == 'High']
 
+    with col1:
+        st.metric("High Stress Counties", f"{len(high_stress_counties):,}")
 
-year_data['stress_level'] = year_data['prime_epop'].apply(
-    lambda x: classify_stress(x, high_threshold, medium_threshold)
-)
+    with col2:
+        st.metric("Average Wage Ratio", f"{overall_avg:.3f}")
 
-# Apply filters
-stress_filter = []
-if "High Stress" in selected_stress:
-    stress_filter.append('High')
-if "Medium Stress" in selected_stress:
-    stress_filter.append('Medium')
-if "Low Stress" in selected_stress:
-    stress_filter.append('Low')
+    with col3:
+        st.metric("High Stress Avg Ratio", f"{high_stress_avg:.3f}" if len(high_stress_counties) > 0 else "—")
 
-filtered_data = year_data[year_data['stress_level'].isin(stress_filter)]
+    # Map
+    st.markdown('<div class="section-header">Economic Agency by County</div>', unsafe_allow_html=True)
 
-# Key metrics
-col1, col2, col3 = st.columns(3)
+    if len(filtered_data) > 0:
+        # Deferred so pydeck is only imported when there is a map to draw
+        import pydeck as pdk
 
-high_stress_counties = year_data[year_data['stress_level'] == 'High']
-overall_avg = year_data['prime_epop'].mean()
-high_stress_avg = high_stress_counties['prime_epop'].mean() if len(high_stress_counties) > 0 else 0
+        # Prepare map data; colors by stress level, indexed by the categorical
+        # codes (0 = High, 1 = Medium, 2 = Low)
+        map_data = filtered_data.assign(
+            color=STRESS_COLORS[filtered_data['stress_level'].cat.codes.to_numpy()].tolist()
+        )
 
-with col1:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-value">{len(high_stress_counties):,}</div>
-        <div class="metric-label">High Stress<br/>Counties</div>
-    </div>
-    """, unsafe_allow_html=True)
+        # Map view
+        view_state = pdk.ViewState(
+            latitude=39.0,
+            longitude=-98.0,
+            zoom=4,
+            pitch=0
+        )
 
-with col2:
-    st.markdown(f"""
-    <div class="metric-card">
-        <div class="metric-value medium-stress">{overall_avg:.3f}</div>
-        <div class="metric-label">Average<br/>Wage Ratio</div>
-    </div>
-    """, unsafe_allow_html=True)
+        # Map layer
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=map_data,
+            get_position=["longitude", "latitude"],
+            # Same radius for every county, so pass it as a constant rather than a column
+            get_radius=6000,
+            get_fill_color="color",
+            pickable=True,
+            opacity=0.7,
+            stroked=False,
+            filled=True,
+        )
 
-with col3:
-    if len(high_stress_counties) > 0:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value high-stress">{high_stress_avg:.3f}</div>
-            <div class="metric-label">High Stress<br/>Avg Ratio</div>
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.markdown(f"""
-        <div class="metric-card">
-            <div class="metric-value">—</div>
-            <div class="metric-label">High Stress<br/>Avg Ratio</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-# Map
-st.markdown('<div class="section-header">Economic Agency by County</div>', unsafe_allow_html=True)
-
-if len(filtered_data) > 0:
-    # Prepare map data
-    map_data = filtered_data.copy()
-    map_data['radius'] = 6000
-
-    # Colors by stress level
-    map_data['color'] = map_data['stress_level'].map({
-        'High': [220, 38, 38, 160],  # Red
-        'Medium': [245, 158, 11, 160],  # Orange
-        'Low': [16, 185, 129, 160]  # Green
-    })
-
-    # Map view
-    view_state = pdk.ViewState(
-        latitude=39.0,
-        longitude=-98.0,
-        zoom=4,
-        pitch=0
-    )
-
-    # Map layer
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        data=map_data,
-        get_position=["longitude", "latitude"],
-        get_radius="radius",
-        get_fill_color="color",
-        pickable=True,
-        opacity=0.7,
-        stroked=False,
-        filled=True,
-    )
-
-    # Create deck
-    deck = pdk.Deck(
-        layers=[layer],
-        initial_view_state=view_state,
-        tooltip={"text": "{county_name}\nWage Ratio: {prime_epop:.3f}\nStress: {stress_level}"},
-        map_style="light"
-    )
-
-    st.pydeck_chart(deck)
-
-    # Legend
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown(f'🔴 High Stress (< {high_threshold})', unsafe_allow_html=True)
-    with col2:
-        st.markdown(f'🟠 Medium Stress ({high_threshold}-{medium_threshold})', unsafe_allow_html=True)
-    with col3:
-        st.markdown(f'🟢 Low Stress (> {medium_threshold})', unsafe_allow_html=True)
+        # Create deck
+        deck = pdk.Deck(
+            layers=[layer],
+            initial_view_state=view_state,
+            tooltip={"text": "{county_name}\nWage Ratio: {prime_epop:.3f}\nStress: {stress_level}"},
+            map_style="light"
+        )
 
-    st.caption(f"Showing {len(filtered_data):,} of {len(year_data):,} counties")
+        st.pydeck_chart(deck)
 
-else:
-    st.warning("No counties match the current filters.")
+        # Legend
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f'🔴 High Stress (< {high_threshold})', unsafe_allow_html=True)
+        with col2:
+            st.markdown(f'🟠 Medium Stress ({high_threshold}-{medium_threshold})', unsafe_allow_html=True)
+        with col3:
+            st.markdown(f'🟢 Low Stress (> {medium_threshold})', unsafe_allow_html=True)
 
-# Top high-stress counties
-if len(high_stress_counties) > 0:
-    st.markdown('<div class="section-header">Counties Requiring Attention</div>', unsafe_allow_html=True)
+        st.caption(f"Showing {len(filtered_data):,} of {len(year_data):,} counties")
 
-    top_counties = high_stress_counties.nsmallest(10, 'prime_epop')
+    else:
+        st.warning("No counties match the current filters.")
 
-    display_df = top_counties[['county_name', 'fips', 'prime_epop']].copy()
-    display_df.columns = ['County', 'FIPS', 'Wage Ratio']
-    display_df['Wage Ratio'] = display_df['Wage Ratio'].apply(lambda x: f"{x:.3f}")
+    # Top high-stress counties
+    if len(high_stress_counties) > 0:
+        st.markdown('<div class="section-header">Counties Requiring Attention</div>', unsafe_allow_html=True)
 
-    st.dataframe(display_df, use_container_width=True, hide_index=True)
+        # Already ordered by wage ratio, so the first rows are the lowest
+        top_counties = high_stress_counties.head(10)
 
-# Export
-st.markdown('<div class="section-header">Export Data</div>', unsafe_allow_html=True)
-col1, col2 = st.columns(2)
+        display_df = top_counties[['county_name', 'fips', 'prime_epop']].set_axis(
+            ['County', 'FIPS', 'Wage Ratio'], axis=1
+        )
 
-with col1:
-    csv_data = filtered_data[['fips', 'county_name', 'prime_epop', 'stress_level']].to_csv(index=False)
-    st.download_button(
-        label=f"Download Filtered Data ({len(filtered_data):,} counties)",
-        data=csv_data,
-        file_name=f"economic_agency_index_{selected_year}.csv",
-        mime="text/csv"
-    )
+        st.dataframe(
+            display_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={'Wage Ratio': st.column_config.NumberColumn(format="%.3f")}
+        )
 
-with col2:
-    if len(high_stress_counties) > 0:
-        high_stress_csv = high_stress_counties[['fips', 'county_name', 'prime_epop']].to_csv(index=False)
+    # Export
+    st.markdown('<div class="section-header">Export Data</div>', unsafe_allow_html=True)
+    col1, col2 = st.columns(2)
+
+    # The CSVs are only generated when a download button is clicked
+    with col1:
+        csv_data = partial(
+            to_csv_bytes, filtered_data, ('fips', 'county_name', 'prime_epop', 'stress_level'),
+            selected_year, high_threshold, medium_threshold, tuple(selected_stress)
+        )
         st.download_button(
-            label=f"Download High-Risk Counties ({len(high_stress_counties):,})",
-            data=high_stress_csv,
-            file_name=f"high_risk_counties_{selected_year}.csv",
+            label=f"Download Filtered Data ({len(filtered_data):,} counties)",
+            data=csv_data,
+            file_name=f"economic_agency_index_{selected_year}.csv",
             mime="text/csv"
         )
 
+    with col2:
+        if len(high_stress_counties) > 0:
+            high_stress_csv = partial(
+                to_csv_bytes, high_stress_counties, ('fips', 'county_name', 'prime_epop'),
+                selected_year, high_threshold
+            )
+            st.download_button(
+                label=f"Download High-Risk Counties ({len(high_stress_counties):,})",
+                data=high_stress_csv,
+                file_name=f"high_risk_counties_{selected_year}.csv",
+                mime="text/csv"
+            )
+
+
+render_dashboard()
+
+with st.sidebar:
+    st.markdown("---")
+    st.markdown(f"""
+    **Economic Agency Index**
+
+    Higher wage ratios indicate more economic agency and self-sufficiency.
+
+    **{county_count:,} counties** analyzed using BEA personal income data.
+    """)
+
 # Footer
 st.markdown(f"""
 <div class="footer">
-    <p>Post-Labor Economics Dashboard | Economic Agency Index | {len(df):,} US Counties</p>
+    <p>Post-Labor Economics Dashboard | Economic Agency Index | {county_count:,} US Counties</p>
     <p>Data: Bureau of Economic Analysis CAINC4 | Updated: {datetime.now().strftime('%Y-%m-%d')}</p>
 </div>
 """, unsafe_allow_html=True)
\ No newline at end of file
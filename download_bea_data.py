@@ -1,8 +1,8 @@
 """Download BEA CAINC4 data for Economic Agency Index calculation"""
-import requests
 import zipfile
-import pandas as pd
+import duckdb
 from pathlib import Path
+from etl_core import SESSION
 import logging
 
 # Set up logging
@@ -24,26 +24,28 @@ def download_bea_data():
     # Download the ZIP file
     logger.info(f"Downloading BEA CAINC4 data from {url}")
     try:
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
-
-        # Save ZIP file
-        zip_path.write_bytes(response.content)
-        logger.info(f"Downloaded {len(response.content) / 1024 / 1024:.1f} MB")
-
-        # Extract ZIP file
+        # Stream the ZIP straight to disk rather than holding it in memory
+        downloaded = 0
+        with SESSION.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with zip_path.open('wb') as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+                    downloaded += len(chunk)
+        logger.info(f"Downloaded {downloaded / 1024 / 1024:.1f} MB")
+
+        # Extract only the all-areas CSV; the per-state files duplicate it
         logger.info("Extracting ZIP file...")
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(data_dir)
+            csv_members = [name for name in zip_ref.namelist()
+                           if name.startswith('CAINC4__ALL_AREAS') and name.endswith('.csv')]
+            if not csv_members:
+                logger.error("No CAINC4 CSV file found in ZIP")
+                return None
+            csv_path = Path(zip_ref.extract(csv_members[0], data_dir))
 
-        # Find the CSV file (it's usually named CAINC4.csv)
-        csv_files = list(data_dir.glob("CAINC4*.csv"))
-        if csv_files:
-            logger.info(f"Found CSV file: {csv_files[0].name}")
-            return csv_files[0]
-        else:
-            logger.error("No CAINC4 CSV file found in ZIP")
-            return None
+        logger.info(f"Found CSV file: {csv_path.name}")
+        return csv_path
 
     except Exception as e:
         logger.error(f"Error downloading data: {e}")
@@ -54,24 +56,52 @@ def explore_cainc4_structure(csv_path):
     """Explore the structure of CAINC4 data"""
     logger.info(f"Exploring CAINC4 data structure...")
 
-    # Read first few rows to understand structure
-    df = pd.read_csv(csv_path, nrows=1000, encoding='latin-1')
-
-    logger.info(f"Columns: {list(df.columns)}")
-    logger.info(f"Shape: {df.shape}")
+    # Let DuckDB read only the columns each query touches instead of
+    # materializing the whole file; same dialect options as build_triage.py
+    con = duckdb.connect()
+    source = f"""read_csv(
+        '{Path(csv_path).as_posix()}',
+        encoding='latin-1',
+        header=true,
+        delim=',',
+        quote='"',
+        all_varchar=true,
+        null_padding=true
+    )"""
+
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    logger.info(f"Columns: {columns}")
 
     # Check for LineCode column
-    if 'LineCode' in df.columns:
-        line_codes = df['LineCode'].unique()
-        logger.info(f"Found LineCode values: {sorted(line_codes)}")
-
-        # Check for our needed line codes
-        needed_codes = [50, 46, 47]  # Wages, Property, Transfers
-        for code in needed_codes:
-            if code in line_codes:
-                logger.info(f"✓ Found LineCode {code}")
-            else:
-                logger.warning(f"✗ Missing LineCode {code}")
+    if 'LineCode' not in columns:
+        return None
+
+    row_count, line_codes = con.execute(f"""
+        SELECT
+            COUNT(*),
+            list(DISTINCT TRY_CAST(LineCode AS INTEGER) ORDER BY TRY_CAST(LineCode AS INTEGER))
+                FILTER (WHERE TRY_CAST(LineCode AS INTEGER) IS NOT NULL)
+        FROM {source}
+    """).fetchone()
+    logger.info(f"Rows: {row_count:,}")
+    logger.info(f"Found LineCode values: {line_codes}")
+
+    # Check for our needed line codes
+    needed_codes = [50, 46, 47]  # Wages, Property, Transfers
+    for code in needed_codes:
+        if code in line_codes:
+            logger.info(f"✓ Found LineCode {code}")
+        else:
+            logger.warning(f"✗ Missing LineCode {code}")
+
+    # Only the needed rows of the most recent year column are materialized
+    year_col = columns[-1]
+    df = con.execute(f"""
+        SELECT GeoFIPS, TRY_CAST(LineCode AS INTEGER) AS LineCode, "{year_col}"
+        FROM {source}
+        WHERE TRY_CAST(LineCode AS INTEGER) IN (50, 46, 47)
+    """).df()
+    logger.info(f"Shape ({year_col}, needed line codes): {df.shape}")
 
     return df
 
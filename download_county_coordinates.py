@@ -1,8 +1,8 @@
 """Download official US county coordinates from Census Bureau Gazetteer Files"""
-import requests
 import zipfile
 import pandas as pd
 from pathlib import Path
+from etl_core import SESSION
 import logging
 
 # Set up logging
@@ -10,6 +10,57 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def download_zip(url, zip_path):
+    """Stream a ZIP file to disk in 128 KB chunks and return the number of bytes written"""
+    downloaded = 0
+    with SESSION.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with zip_path.open('wb') as f:
+            for chunk in response.iter_content(chunk_size=128 * 1024):
+                f.write(chunk)
+                downloaded += len(chunk)
+    return downloaded
+
+
+def process_gazetteer_zip(zip_path):
+    """Read the county Gazetteer file from a ZIP into fips, county_name, latitude, longitude"""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # Find the text file inside
+        txt_files = [f for f in zip_ref.namelist() if f.endswith('.txt')]
+        if not txt_files:
+            raise ValueError("No text file found in ZIP")
+
+        # Let the C parser read the tab-delimited file straight from the ZIP,
+        # keeping only the columns we need. Census pads the last header
+        # (INTPTLONG) with trailing spaces, so names are matched stripped.
+        logger.info("Processing coordinate data...")
+        with zip_ref.open(txt_files[0]) as f:
+            df = pd.read_csv(
+                f,
+                sep='\t',
+                dtype={'GEOID': str},
+                usecols=lambda c: c.strip() in {'GEOID', 'NAME', 'INTPTLAT', 'INTPTLONG'},
+                encoding='utf-8'
+            )
+    df.columns = df.columns.str.strip()
+
+    # Clean and standardize the data
+    # GEOID is the 5-digit FIPS code we need; it is read as a string, so it
+    # only needs padding if the file ever drops the leading zeros
+    fips = df['GEOID']
+    if not (fips.str.len() == 5).all():
+        fips = fips.str.zfill(5)
+    coords_df = pd.DataFrame({
+        'fips': fips,
+        'county_name': df['NAME'],
+        'latitude': pd.to_numeric(df['INTPTLAT'], errors='coerce'),
+        'longitude': pd.to_numeric(df['INTPTLONG'], errors='coerce'),
+    })
+
+    # Remove any rows with missing coordinates
+    return coords_df.dropna(subset=['latitude', 'longitude'])
+
+
 def download_county_coordinates():
     """Download and process Census Bureau county coordinates"""
 
@@ -20,69 +71,26 @@ def download_county_coordinates():
     # Census Bureau Gazetteer file URL (2024 version)
     url = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2024_Gazetteer/2024_Gaz_counties_national.zip"
     zip_path = data_dir / "county_coordinates.zip"
-    csv_path = data_dir / "county_coordinates.csv"
+    # Parquet keeps the string FIPS and float coordinates typed, so readers
+    # don't re-parse them the way they would a CSV
+    parquet_path = data_dir / "county_coordinates.parquet"
 
     # Check if we already have the processed file
-    if csv_path.exists():
-        logger.info(f"County coordinates file already exists: {csv_path}")
-        return csv_path
+    if parquet_path.exists():
+        logger.info(f"County coordinates file already exists: {parquet_path}")
+        return parquet_path
 
     try:
         logger.info(f"Downloading county coordinates from Census Bureau...")
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
+        downloaded = download_zip(url, zip_path)
+        logger.info(f"Downloaded {downloaded / 1024:.1f} KB")
 
-        # Save ZIP file
-        zip_path.write_bytes(response.content)
-        logger.info(f"Downloaded {len(response.content) / 1024:.1f} KB")
-
-        # Extract ZIP file
         logger.info("Extracting coordinates file...")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Find the text file inside
-            txt_files = [f for f in zip_ref.namelist() if f.endswith('.txt')]
-            if not txt_files:
-                raise ValueError("No text file found in ZIP")
-
-            # Extract the main file
-            txt_file = txt_files[0]
-            with zip_ref.open(txt_file) as f:
-                content = f.read().decode('utf-8')
-
-        # Parse the tab-delimited file
-        logger.info("Processing coordinate data...")
-        lines = content.strip().split('\n')
-
-        # Parse header
-        header = lines[0].split('\t')
-        logger.info(f"Columns: {header}")
-
-        # Parse data rows
-        data = []
-        for line in lines[1:]:
-            row = line.split('\t')
-            if len(row) == len(header):
-                data.append(row)
-
-        # Create DataFrame
-        df = pd.DataFrame(data, columns=header)
-
-        # Clean and standardize the data
-        # GEOID is the 5-digit FIPS code we need
-        df['fips'] = df['GEOID'].str.zfill(5)
-        df['latitude'] = pd.to_numeric(df['INTPTLAT'], errors='coerce')
-        df['longitude'] = pd.to_numeric(df['INTPTLONG'], errors='coerce')
-        df['county_name'] = df['NAME']
-
-        # Select only the columns we need
-        coords_df = df[['fips', 'county_name', 'latitude', 'longitude']].copy()
-
-        # Remove any rows with missing coordinates
-        coords_df = coords_df.dropna(subset=['latitude', 'longitude'])
+        coords_df = process_gazetteer_zip(zip_path)
 
         # Save processed coordinates
-        coords_df.to_csv(csv_path, index=False)
-        logger.info(f"Saved {len(coords_df)} county coordinates to {csv_path}")
+        coords_df.to_parquet(parquet_path, compression='zstd', index=False)
+        logger.info(f"Saved {len(coords_df)} county coordinates to {parquet_path}")
 
         # Show sample data
         logger.info("Sample coordinates:")
@@ -91,7 +99,7 @@ def download_county_coordinates():
         # Clean up ZIP file
         zip_path.unlink()
 
-        return csv_path
+        return parquet_path
 
     except Exception as e:
         logger.error(f"Error downloading county coordinates: {e}")
@@ -101,43 +109,16 @@ def download_county_coordinates():
         logger.info(f"Trying fallback URL: {fallback_url}")
 
         try:
-            response = requests.get(fallback_url, timeout=60)
-            response.raise_for_status()
-
-            zip_path.write_bytes(response.content)
+            download_zip(fallback_url, zip_path)
             logger.info("Downloaded fallback file successfully")
 
-            # Extract and process (same logic as above)
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                txt_files = [f for f in zip_ref.namelist() if f.endswith('.txt')]
-                if txt_files:
-                    txt_file = txt_files[0]
-                    with zip_ref.open(txt_file) as f:
-                        content = f.read().decode('utf-8')
-
-                    lines = content.strip().split('\n')
-                    header = lines[0].split('\t')
-
-                    data = []
-                    for line in lines[1:]:
-                        row = line.split('\t')
-                        if len(row) == len(header):
-                            data.append(row)
-
-                    df = pd.DataFrame(data, columns=header)
-                    df['fips'] = df['GEOID'].str.zfill(5)
-                    df['latitude'] = pd.to_numeric(df['INTPTLAT'], errors='coerce')
-                    df['longitude'] = pd.to_numeric(df['INTPTLONG'], errors='coerce')
-                    df['county_name'] = df['NAME']
-
-                    coords_df = df[['fips', 'county_name', 'latitude', 'longitude']].copy()
-                    coords_df = coords_df.dropna(subset=['latitude', 'longitude'])
+            coords_df = process_gazetteer_zip(zip_path)
 
-                    coords_df.to_csv(csv_path, index=False)
-                    logger.info(f"Saved {len(coords_df)} county coordinates to {csv_path}")
+            coords_df.to_parquet(parquet_path, compression='zstd', index=False)
+            logger.info(f"Saved {len(coords_df)} county coordinates to {parquet_path}")
 
-                    zip_path.unlink()
-                    return csv_path
+            zip_path.unlink()
+            return parquet_path
 
         except Exception as e2:
             logger.error(f"Fallback also failed: {e2}")
@@ -146,28 +127,34 @@ def download_county_coordinates():
 
 def test_coordinates():
     """Test the coordinate data"""
+    parquet_path = Path('data/county_coordinates.parquet')
     csv_path = Path('data/county_coordinates.csv')
-    if csv_path.exists():
-        df = pd.read_csv(csv_path)
-        logger.info(f"Loaded {len(df)} counties")
-        logger.info("Sample data:")
-        print(df.head())
-
-        # Check a few known counties
-        known_counties = {
-            '01001': 'Autauga County, Alabama',
-            '06037': 'Los Angeles County, California',
-            '48201': 'Harris County, Texas',
-            '36061': 'New York County, New York'
-        }
-
-        for fips, name in known_counties.items():
-            county = df[df['fips'] == fips]
-            if not county.empty:
-                lat, lng = county.iloc[0]['latitude'], county.iloc[0]['longitude']
-                logger.info(f"{name}: {lat:.3f}, {lng:.3f}")
+    if parquet_path.exists():
+        df = pd.read_parquet(parquet_path)
+    elif csv_path.exists():
+        # Left over from older downloads, which saved CSV
+        df = pd.read_csv(csv_path, dtype={'fips': str})
     else:
         logger.error("County coordinates file not found")
+        return
+
+    logger.info(f"Loaded {len(df)} counties")
+    logger.info("Sample data:")
+    print(df.head())
+
+    # Check a few known counties
+    known_counties = {
+        '01001': 'Autauga County, Alabama',
+        '06037': 'Los Angeles County, California',
+        '48201': 'Harris County, Texas',
+        '36061': 'New York County, New York'
+    }
+
+    for fips, name in known_counties.items():
+        county = df[df['fips'] == fips]
+        if not county.empty:
+            lat, lng = county.iloc[0]['latitude'], county.iloc[0]['longitude']
+            logger.info(f"{name}: {lat:.3f}, {lng:.3f}")
 
 
 if __name__ == "__main__":
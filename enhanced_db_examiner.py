@@ -1,5 +1,4 @@
 import duckdb
-import pandas as pd
 import pathlib
 import json
 import sqlite3
@@ -7,6 +6,23 @@ import argparse
 import sys
 
 
+NUMERIC_TYPES = {
+    'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT',
+    'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT', 'UHUGEINT',
+    'FLOAT', 'DOUBLE'
+}
+
+
+def is_numeric_type(column_type):
+    """Check whether a DuckDB column type holds numbers"""
+    return column_type in NUMERIC_TYPES or column_type.startswith('DECIMAL')
+
+
+def quote_ident(name):
+    """Quote a table or column name for interpolation into SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+
 def examine_database(db_path, export_format=None):
     """Examine the contents of a DuckDB database file"""
     if not pathlib.Path(db_path).exists():
@@ -31,49 +47,65 @@ def examine_database(db_path, export_format=None):
             print("No tables found in database.")
             return
 
+        # Column names per table, fetched once so foreign key candidates can
+        # be found by set intersection instead of probing every column pair
+        table_columns = {}
+        for tbl, col in con.execute("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_catalog = current_database() AND table_schema = current_schema()
+        """).fetchall():
+            table_columns.setdefault(tbl, set()).add(col)
+
         # Process each table
         for table_info in tables:
             table_name = table_info[0]
+            # Names can't be bound as parameters, so quote them wherever they're spliced into SQL
+            table = quote_ident(table_name)
             print(f"===== TABLE: {table_name} =====")
 
             # Get detailed column info
             print("\nSchema:")
-            schema_info = con.execute(f"PRAGMA table_info({table_name})").fetchall()
+            schema_info = con.execute("SELECT * FROM pragma_table_info(?)", [table_name]).fetchall()
             for col in schema_info:
                 print(f"  Column {col[0]}: {col[1]} ({col[2]}){' PRIMARY KEY' if col[5] else ''}")
 
-            # Get row count
-            row_count = con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-            print(f"\nRow count: {row_count}")
+            # Get row count; tables keep an estimate in their metadata, views have to be counted
+            row_count = con.execute("""
+                SELECT estimated_size FROM duckdb_tables()
+                WHERE database_name = current_database() AND schema_name = current_schema()
+                  AND table_name = ?
+            """, [table_name]).fetchone()
+            if row_count is None or row_count[0] is None:
+                row_count = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                print(f"\nRow count: {row_count}")
+            else:
+                row_count = row_count[0]
+                print(f"\nRow count (estimated): ~{row_count}")
 
-            # Get all data if small table, otherwise sample
+            # Get all data if small table, otherwise sample; DuckDB prints the
+            # rows itself, so no DataFrame is built just for display
             if row_count <= 100:
                 print(f"\nAll {row_count} rows:")
-                df = con.execute(f"SELECT * FROM {table_name}").fetchdf()
+                display_rows = row_count
             else:
                 print(f"\nSample of data (first 10 rows):")
-                df = con.execute(f"SELECT * FROM {table_name} LIMIT 10").fetchdf()
-
-            # Print dataframe with improved formatting
-            pd.set_option('display.max_columns', None)
-            pd.set_option('display.width', 1000)
-            pd.set_option('display.max_colwidth', 50)
-            print(df)
-
-            # Print basic statistics for numeric columns
-            numeric_cols = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+                display_rows = 10
+            con.sql(f"SELECT * FROM {table} LIMIT {display_rows}").show(
+                max_rows=display_rows, max_col_width=50
+            )
+
+            # Print basic statistics for numeric columns, classified by the schema's column types
+            columns = [col[1] for col in schema_info]
+            numeric_cols = [col[1] for col in schema_info if is_numeric_type(col[2])]
             if numeric_cols:
                 print("\nNumeric column statistics:")
-                for col in numeric_cols:
-                    stats = con.execute(f"""
-                        SELECT 
-                            MIN({col}), 
-                            MAX({col}), 
-                            AVG({col}), 
-                            STDDEV({col}),
-                            MEDIAN({col})
-                        FROM {table_name}
-                    """).fetchone()
+                # Compute every column's statistics in a single scan of the table
+                agg_parts = []
+                for col in map(quote_ident, numeric_cols):
+                    agg_parts += [f"MIN({col})", f"MAX({col})", f"AVG({col})", f"STDDEV({col})", f"MEDIAN({col})"]
+                all_stats = con.execute(f"SELECT {', '.join(agg_parts)} FROM {table}").fetchone()
+                for i, col in enumerate(numeric_cols):
+                    stats = all_stats[i * 5:(i + 1) * 5]
                     print(f"  {col}:")
                     print(f"    Min: {stats[0]}")
                     print(f"    Max: {stats[1]}")
@@ -82,33 +114,43 @@ def examine_database(db_path, export_format=None):
                     print(f"    Median: {stats[4]}")
 
             # Categorical/text columns
-            cat_cols = [col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])]
+            cat_cols = [col for col in columns if col not in numeric_cols]
             if cat_cols:
                 print("\nCategorical/text column values:")
-                for col in cat_cols:
-                    unique_vals = con.execute(f"SELECT DISTINCT {col} FROM {table_name}").fetchall()
-                    unique_values = [val[0] for val in unique_vals]
-                    if len(unique_values) <= 20:  # Only show if not too many unique values
-                        print(f"  {col}: {unique_values}")
-                    else:
-                        print(f"  {col}: {len(unique_values)} unique values (too many to display)")
+                # Estimate distinct values (NULL included) for every column in one scan
+                # with HyperLogLog sketches, then fetch the actual values only for
+                # columns that may have few enough to show
+                approx_counts = con.execute("SELECT " + ", ".join(
+                    f"approx_count_distinct({col}) + (COUNT(*) > COUNT({col}))::INTEGER"
+                    for col in map(quote_ident, cat_cols)
+                ) + f" FROM {table}").fetchone()
+                for col, approx_count in zip(cat_cols, approx_counts):
+                    if approx_count <= 25:
+                        unique_vals = con.execute(f"SELECT DISTINCT {quote_ident(col)} FROM {table} LIMIT 21").fetchall()
+                        if len(unique_vals) <= 20:  # Only show if not too many unique values
+                            print(f"  {col}: {[val[0] for val in unique_vals]}")
+                            continue
+                    print(f"  {col}: ~{approx_count} unique values (too many to display)")
 
             # Get potential relationships between tables (if more than one table)
             if len(tables) > 1:
                 print("\nPotential Foreign Keys:")
                 for other_table in [t[0] for t in tables if t[0] != table_name]:
-                    for col in df.columns:
-                        # This is a simplistic check - in a real system this would be more sophisticated
+                    shared_cols = table_columns.get(table_name, set()) & table_columns.get(other_table, set())
+                    for col in sorted(shared_cols):
+                        # This is a simplistic check - in a real system this would be more sophisticated.
+                        # EXISTS stops at the first matching row instead of counting them all.
                         try:
-                            count = con.execute(f"""
-                                SELECT COUNT(*) FROM {table_name} t1
-                                LEFT JOIN {other_table} t2 ON t1.{col} = t2.{col}
-                                WHERE t2.{col} IS NOT NULL
+                            matched = con.execute(f"""
+                                SELECT EXISTS (
+                                    SELECT 1 FROM {table} t1
+                                    JOIN {quote_ident(other_table)} t2 USING ({quote_ident(col)})
+                                )
                             """).fetchone()[0]
-                            if count > 0:
+                            if matched:
                                 print(f"  Possible join: {table_name}.{col} → {other_table}.{col}")
                         except:
-                            pass  # Skip if error (e.g., column doesn't exist in other table)
+                            pass  # Skip if error (e.g., incompatible column types)
 
             # Look for indexes
             try:
@@ -135,30 +177,31 @@ def examine_database(db_path, export_format=None):
 
 def export_data(con, table_name, export_format):
     """Export table data to various formats"""
-    df = con.execute(f"SELECT * FROM {table_name}").fetchdf()
-
-    if export_format == 'csv':
-        file_name = f"{table_name}.csv"
-        df.to_csv(file_name, index=False)
+    table = quote_ident(table_name)
+
+    # DuckDB writes these formats itself, straight from its columnar data
+    copy_options = {
+        'csv': "FORMAT CSV, HEADER true",
+        'json': "FORMAT JSON, ARRAY true",
+        'parquet': "FORMAT PARQUET",
+    }
+    if export_format in copy_options:
+        file_name = f"{table_name}.{export_format}"
+        file_literal = file_name.replace("'", "''")
+        con.execute(f"COPY {table} TO '{file_literal}' ({copy_options[export_format]})")
         print(f"Data exported to {file_name}")
+        return
 
-    elif export_format == 'json':
-        file_name = f"{table_name}.json"
-        df.to_json(file_name, orient='records')
-        print(f"Data exported to {file_name}")
+    # SQLite and Excel still go through pandas
+    df = con.execute(f"SELECT * FROM {table}").fetchdf()
 
-    elif export_format == 'sqlite':
+    if export_format == 'sqlite':
         file_name = f"{table_name}.sqlite"
         sqlite_con = sqlite3.connect(file_name)
         df.to_sql(table_name, sqlite_con, index=False, if_exists='replace')
         sqlite_con.close()
         print(f"Data exported to {file_name}")
 
-    elif export_format == 'parquet':
-        file_name = f"{table_name}.parquet"
-        df.to_parquet(file_name, index=False)
-        print(f"Data exported to {file_name}")
-
     elif export_format == 'excel':
         file_name = f"{table_name}.xlsx"
         df.to_excel(file_name, index=False)
@@ -1,26 +1,64 @@
 """Shared ETL utilities for Post‑Labor dashboards.
 Requires: pandas, duckdb, pyarrow, requests, tqdm
 """
-import duckdb, pandas as pd, requests, io, os, pathlib, datetime
+import duckdb, numpy as np, pandas as pd, requests, io, os, pathlib, datetime
 from pathlib import Path
+from email.utils import formatdate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 DATA_DIR = Path(__file__).parent / 'data'
 DATA_DIR.mkdir(exist_ok=True)
 
-def fetch_csv(url: str, fname: str) -> Path:
-    """Download a CSV if not cached; return local path."""
+# One pooled session for every downloader: connections to the same host are
+# reused and transient gateway errors are retried with backoff
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8,
+                       max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]))
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
+def fetch_csv(url: str, fname: str, refresh: bool = False) -> Path:
+    """Download a CSV if not cached; return local path.
+    With refresh=True a cached file is re-fetched only if the server has a newer copy."""
     dest = DATA_DIR / fname
-    if not dest.exists():
-        r = requests.get(url, timeout=60)
+    if dest.exists() and not refresh:
+        return dest
+    headers = {}
+    if dest.exists():
+        headers['If-Modified-Since'] = formatdate(dest.stat().st_mtime, usegmt=True)
+    # Stream to a partial file so a failed download never replaces the cache
+    tmp = dest.with_name(dest.name + '.part')
+    with SESSION.get(url, headers=headers, stream=True, timeout=60) as r:
+        if r.status_code == 304:
+            return dest
         r.raise_for_status()
-        dest.write_bytes(r.content)
+        with open(tmp, 'wb') as f:
+            for chunk in r.iter_content(128 * 1024):
+                f.write(chunk)
+    tmp.replace(dest)
     return dest
 
 def standardise_fips(df, col='fips'):
-    """Ensure 5‑digit zero‑padded county FIPS as str."""
-    df[col] = df[col].astype(str).str.zfill(5)
+    """Ensure 5‑digit zero‑padded county FIPS as a categorical of str."""
+    # Pad each distinct code once rather than every row; the categorical keeps
+    # one copy of each FIPS string plus a small integer code per row
+    codes, uniques = pd.factorize(df[col])
+    padded_codes, padded = pd.factorize(pd.Index(uniques).astype(str).str.zfill(5))
+    valid = codes >= 0
+    out = np.full(len(codes), -1)
+    out[valid] = padded_codes[codes[valid]]  # missing values stay -1
+    df[col] = pd.Categorical.from_codes(out, categories=padded)
     return df
 
 def zscore(series):
-    return (series - series.mean())/series.std()
+    # Reduce on the raw float array, skipping NaN with the same ddof=1 as Series.std
+    a = series.to_numpy(dtype='float64', na_value=np.nan)
+    # Fewer than two values has no sample std, and a constant series divides
+    # 0 by 0; both give NaN like the Series arithmetic, without numpy warnings
+    if np.count_nonzero(~np.isnan(a)) < 2:
+        return pd.Series(np.nan, index=series.index, name=series.name)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (a - np.nanmean(a)) / np.nanstd(a, ddof=1)
+    return pd.Series(z, index=series.index, name=series.name)
 
 # -- Add more helpers as the project grows --
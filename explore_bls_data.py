@@ -1,12 +1,17 @@
 """BLS Data Explorer for Post-Labor Triage Dashboard
 Explores the structure of BLS data files to assist in ETL development
 """
-import requests
+import io
+import json
+import mmap
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import yaml
 import os
+import sys
 import logging
 from pathlib import Path
+from etl_core import SESSION
 
 # Set up logging
 logging.basicConfig(
@@ -15,9 +20,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def fetch_and_explore_bls_file(url, local_filename):
-    """Download and explore a BLS data file to understand its structure"""
-    logger.info(f"Exploring BLS data from {url}")
+def fetch_and_explore_bls_file(url, local_filename, log=logger):
+    """Download and explore a BLS data file to understand its structure
+
+    Returns a metadata dict (delimiter, columns, has_lau, has_ces, mtime),
+    read from the cached sidecar if this copy of the file was already explored,
+    or None if the file could not be read. Progress is written to `log`.
+    """
+    log.info(f"Exploring BLS data from {url}")
 
     data_dir = Path('data')
     data_dir.mkdir(exist_ok=True)
@@ -25,90 +35,156 @@ def fetch_and_explore_bls_file(url, local_filename):
 
     # Download the file if it doesn't exist
     if not file_path.exists():
-        logger.info(f"Downloading file to {file_path}")
-        r = requests.get(url, timeout=60)
-        r.raise_for_status()
-        file_path.write_bytes(r.content)
+        log.info(f"Downloading file to {file_path}")
+        # Stream to disk instead of holding the whole file in memory, via a
+        # partial file so an interrupted download is never taken as complete
+        tmp_path = file_path.with_name(file_path.name + '.part')
+        with SESSION.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=128 * 1024):
+                    f.write(chunk)
+        tmp_path.replace(file_path)
+
+    # The structure found by an earlier run is kept in a JSON sidecar; reuse
+    # it as long as the data file hasn't been replaced since
+    meta_path = file_path.with_name(file_path.name + '.meta.json')
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta.get('mtime') == file_path.stat().st_mtime:
+            log.info(f"Using cached structure from {meta_path}")
+            log.info(f"Columns: {meta['columns']}")
+            log.info(f"Has LAU series: {meta['has_lau']}, has CES series: {meta['has_ces']}")
+            return meta
+
+    # mmap can't map an empty file
+    if file_path.stat().st_size == 0:
+        log.error(f"Downloaded file is empty: {file_path}")
+        return None
 
-    # First, try to determine the file format
-    with open(file_path, 'r') as f:
-        sample = f.read(2000)  # Read first 2000 chars
+    # First, try to determine the file format from the first 2000 bytes,
+    # read through a memory map rather than a buffered text stream
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sample = mm[:2000].decode('utf-8', 'replace')
 
     # Check delimiter without using backslash in f-string expression
     tab_char = '\t'  # Define tab character outside the f-string
     delimiter = tab_char if tab_char in sample else ','
-    logger.info(f"Detected delimiter: {'tab' if delimiter == tab_char else 'comma'}")
+    log.info(f"Detected delimiter: {'tab' if delimiter == tab_char else 'comma'}")
 
     # Try to read the file
     try:
-        df = pd.read_csv(file_path, delimiter=delimiter, nrows=1000, low_memory=False)
+        df = pd.read_csv(file_path, delimiter=delimiter, nrows=1000, engine='c', low_memory=False)
 
         # Basic file information
-        logger.info(f"File successfully loaded. Preview of structure:")
-        logger.info(f"Columns: {df.columns.tolist()}")
-        logger.info(f"Sample rows: {len(df)}")
+        log.info(f"File successfully loaded. Preview of structure:")
+        log.info(f"Columns: {df.columns.tolist()}")
+        log.info(f"Sample rows: {len(df)}")
 
         # Check for key columns
         for col in ['series_id', 'year', 'value', 'period']:
-            logger.info(f"Column '{col}' exists: {col in df.columns}")
+            log.info(f"Column '{col}' exists: {col in df.columns}")
 
         # If series_id exists, analyze its structure
+        has_lau = has_ces = False
         if 'series_id' in df.columns:
             series_samples = df['series_id'].unique()[:10]
-            logger.info(f"Sample series IDs: {series_samples}")
+            log.info(f"Sample series IDs: {series_samples}")
 
             # Try to find patterns in series IDs
-            logger.info("Analyzing series ID patterns...")
-            has_lau = any(s.startswith('LAU') for s in df['series_id'].dropna().astype(str))
+            log.info("Analyzing series ID patterns...")
+            # Convert once and let the vectorized string methods do the scans
+            series_ids = df['series_id'].dropna().astype('string')
+            has_lau = series_ids.str.startswith('LAU').any()
             if has_lau:
                 # Local Area Unemployment Statistics
-                logger.info("Found LAU series (Local Area Unemployment)")
+                log.info("Found LAU series (Local Area Unemployment)")
 
                 # Try to extract county identifiers
-                has_fips = df['series_id'].astype(str).str.contains(r'\d{5}').any()
+                has_fips = series_ids.str.contains(r'\d{5}', regex=True).any()
                 if has_fips:
-                    logger.info("Series contains 5-digit codes (likely FIPS)")
+                    log.info("Series contains 5-digit codes (likely FIPS)")
 
-            has_ces = any(s.startswith('CES') for s in df['series_id'].dropna().astype(str))
+            has_ces = series_ids.str.startswith('CES').any()
             if has_ces:
                 # Current Employment Statistics
-                logger.info("Found CES series (Current Employment Statistics)")
+                log.info("Found CES series (Current Employment Statistics)")
 
         # Check for date/period information
         if 'year' in df.columns:
             years = df['year'].unique()
-            logger.info(f"Years in data: {sorted(years)}")
+            log.info(f"Years in data: {sorted(years)}")
 
         if 'period' in df.columns:
             periods = df['period'].unique()
-            logger.info(f"Periods in data: {sorted(periods)}")
+            log.info(f"Periods in data: {sorted(periods)}")
 
         # Sample data rows
-        logger.info("\nSample data rows:")
-        print(df.head(5))
+        log.info(f"\nSample data rows:\n{df.head(5)}")
 
-        return df
+        meta = {
+            'delimiter': delimiter,
+            'columns': df.columns.tolist(),
+            'has_lau': bool(has_lau),
+            'has_ces': bool(has_ces),
+            'mtime': file_path.stat().st_mtime
+        }
+        meta_path.write_text(json.dumps(meta))
+
+        return meta
 
     except Exception as e:
-        logger.error(f"Error exploring file: {str(e)}")
+        log.error(f"Error exploring file: {str(e)}")
         return None
 
+def explore_kpi_file(url, local_filename):
+    """Run fetch_and_explore_bls_file with its log output collected, not printed
+
+    Worker threads would otherwise interleave their lines on the console; the
+    caller prints the returned report as one block once the file is done.
+    Returns (metadata dict or None, report text).
+    """
+    report = io.StringIO()
+    handler = logging.StreamHandler(report)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log = logging.getLogger(f"{__name__}.{local_filename}")
+    log.propagate = False
+    log.addHandler(handler)
+    try:
+        return fetch_and_explore_bls_file(url, local_filename, log), report.getvalue()
+    finally:
+        log.removeHandler(handler)
+
 def main():
     """Main exploration process"""
     try:
         # Load the ETL specification
         spec = yaml.safe_load(Path('triage_spec.yaml').read_text())
 
-        # Explore each KPI data source
+        # KPIs can share a source file; explore each file once so two workers
+        # never download to the same path at the same time
+        kpis_by_file = {}
         for kpi in spec['kpis']:
-            logger.info(f"\n{'='*50}")
-            logger.info(f"Exploring data for KPI: {kpi['name']}")
-            logger.info(f"{'='*50}")
-
-            df = fetch_and_explore_bls_file(kpi['source_url'], kpi['local_csv'])
-
-            logger.info(f"\nCompleted exploration for {kpi['name']}")
-            logger.info(f"{'='*50}\n")
+            kpis_by_file.setdefault(kpi['local_csv'], []).append(kpi)
+
+        # Explore each data source; the downloads are network-bound, so run
+        # them on a small thread pool and print each report as it finishes
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(kpis_by_file)))) as executor:
+            futures = {
+                executor.submit(explore_kpi_file, kpis[0]['source_url'], local_csv): kpis
+                for local_csv, kpis in kpis_by_file.items()
+            }
+
+            for future in as_completed(futures):
+                _, report = future.result()
+                names = ', '.join(kpi['name'] for kpi in futures[future])
+
+                logger.info(f"\n{'='*50}")
+                logger.info(f"Exploring data for KPI: {names}")
+                logger.info(f"{'='*50}")
+                print(report, end='', file=sys.stderr, flush=True)
+                logger.info(f"\nCompleted exploration for {names}")
+                logger.info(f"{'='*50}\n")
 
     except Exception as e:
         logger.error(f"Exploration failed: {str(e)}")
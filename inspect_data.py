@@ -1,4 +1,4 @@
-import pandas as pd
+import duckdb
 from pathlib import Path
 
 # Load the data and examine GeoFIPS structure
@@ -8,24 +8,47 @@ if not csv_path.exists():
     csv_path = Path('data/CAINC4_AK_1969_2023.csv')
 
 print(f"Reading from: {csv_path}")
-df = pd.read_csv(csv_path, encoding='latin-1', low_memory=False)
+# DuckDB only parses the columns each query touches, in parallel; the dialect
+# is fixed rather than sniffed, and null_padding lets the short footnote lines
+# at the end of the file through (same options as build_triage.py)
+con = duckdb.connect()
+con.execute(f"""
+    CREATE VIEW cainc4 AS
+    SELECT * FROM read_csv(
+        '{csv_path.as_posix()}',
+        encoding='latin-1',
+        header=true,
+        delim=',',
+        quote='"',
+        all_varchar=true,
+        null_padding=true
+    )
+""")
 
-print(f"Total rows: {len(df)}")
-print(f"Columns: {list(df.columns)}")
+print(f"Total rows: {con.execute('SELECT COUNT(*) FROM cainc4').fetchone()[0]}")
+print(f"Columns: {[row[0] for row in con.execute('DESCRIBE cainc4').fetchall()]}")
 
 # Look at unique GeoFIPS values
 print(f"\nSample GeoFIPS values:")
-geo_fips = df['GeoFIPS'].unique()
+geo_fips = [row[0] for row in con.execute("SELECT DISTINCT GeoFIPS FROM cainc4 ORDER BY 1").fetchall()]
 print(f"First 20 GeoFIPS: {geo_fips[:20]}")
 print(f"Total unique GeoFIPS: {len(geo_fips)}")
 
-# Look for county-like patterns
-county_patterns = [fips for fips in geo_fips if str(fips).isdigit() and len(str(fips)) == 5]
+# Look for county-like patterns; BEA pads GeoFIPS with quotes and a leading space
+county_patterns = [row[0] for row in con.execute("""
+    SELECT DISTINCT trim(GeoFIPS, '" ') AS fips FROM cainc4
+    WHERE regexp_full_match(trim(GeoFIPS, '" '), '[0-9]{5}')
+    ORDER BY 1
+""").fetchall()]
 print(f"\n5-digit numeric GeoFIPS (likely counties): {len(county_patterns)}")
 print(f"Sample county FIPS: {county_patterns[:10]}")
 
 # Check what LineCode 50 (wages) looks like
-wages_data = df[df['LineCode'] == 50]
-print(f"\nWages data (LineCode 50): {len(wages_data)} rows")
-if len(wages_data) > 0:
-    print(f"Sample wages GeoFIPS: {wages_data['GeoFIPS'].unique()[:10]}")
\ No newline at end of file
+wages_count, wages_fips = con.execute("""
+    SELECT COUNT(*), list(DISTINCT GeoFIPS ORDER BY GeoFIPS)[:10]
+    FROM cainc4
+    WHERE TRY_CAST(LineCode AS INTEGER) = 50
+""").fetchone()
+print(f"\nWages data (LineCode 50): {wages_count} rows")
+if wages_count > 0:
+    print(f"Sample wages GeoFIPS: {wages_fips}")